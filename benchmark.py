@@ -0,0 +1,294 @@
+import argparse
+import asyncio
+import os
+import pickle
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import db
+
+
+def synthetic_lessons(classes: int, seed: int = 0) -> list[tuple[str, str, str, str, str, str | None, int, int]]:
+    # (subject, teacher name, teacher surname, room, class, group, day, hour) for a full week of every class
+    rng = random.Random(seed)
+    subjects = [f"Przedmiot {i}" for i in range(40)]
+    teachers = [(f"Imie{i}", f"Nazwisko{i}") for i in range(80)]
+    rows = []
+    for c in range(classes):
+        for day in range(5):
+            for hour in range(rng.randint(6, 9)):
+                name, surname = rng.choice(teachers)
+                rows.append((
+                    rng.choice(subjects), name, surname, f"{rng.randint(1, 40)}",
+                    f"{c + 1}{chr(ord('a') + c % 5)}", None, day, hour
+                ))
+    return rows
+
+
+class IndexesBeforeLoad(db.Database):
+    def initialize(self):
+        super().initialize()
+        self.create_indexes()
+
+
+class NoIndexes(db.Database):
+    def create_indexes(self):
+        pass
+
+
+def bench_database(args):
+    import warnings
+
+    import zschie_timetable_xml
+
+    warnings.simplefilter("ignore", RuntimeWarning)
+    lessons = synthetic_school_lessons(args.classes) * args.repeat
+    class_names = sorted({lesson.class_name for lesson in lessons})
+    teachers = sorted({(lesson.teacher.name, lesson.teacher.surname) for lesson in lessons})
+
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in db.PROFILES:
+            for indexes, database_class in (
+                    ("before load", IndexesBeforeLoad), ("after load", db.Database), ("none", NoIndexes)
+            ):
+                path = os.path.join(directory, f"{profile}-{indexes.replace(' ', '-')}.db")
+                start = time.perf_counter()
+                zschie_timetable_xml.saveLessons(lessons, database_class(path, profile=profile))
+                load = time.perf_counter() - start
+
+                connection = sqlite3.connect(path)
+                start = time.perf_counter()
+                for class_name in class_names:
+                    for day in range(5):
+                        connection.execute(
+                            "SELECT hour, subject_id, teacher_id, room_id FROM Lessons "
+                            "WHERE class_id = ? AND day = ? ORDER BY hour",
+                            (class_name, day)
+                        ).fetchall()
+                for name, surname in teachers:
+                    connection.execute(
+                        "SELECT teacher_id FROM Teachers WHERE name = ? AND surname = ?", (name, surname)
+                    ).fetchall()
+                query = time.perf_counter() - start
+                connection.close()
+
+                print(f"{profile:>8}, indexes {indexes:>11}: load {load * 1000:8.1f} ms, "
+                      f"{len(class_names) * 5 + len(teachers)} queries {query * 1000:8.1f} ms")
+
+
+def import_times(module: str) -> list[tuple[int, int, str]]:
+    # (self us, cumulative us, package) as reported by `python -X importtime`
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, package = line.removeprefix("import time:").split("|")
+        times.append((int(own), int(cumulative), package.rstrip()))
+    return times
+
+
+# must only be imported by the code paths that need them, never by importing the CLI module
+DEFERRED_IMPORTS = ("numpy", "pandas", "pdfminer", "tkinter", "multiprocessing", "concurrent.futures")
+
+
+def eager_imports(module: str) -> list[str]:
+    result = subprocess.run(
+        [
+            sys.executable, "-c",
+            f"import sys, {module}; print(' '.join(name for name in {DEFERRED_IMPORTS!r} if name in sys.modules))"
+        ],
+        capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    return result.stdout.split()
+
+
+def bench_startup(args):
+    times = import_times(args.module)
+    top_level = [entry for entry in times if not entry[2].startswith("  ")]
+    total = sum(cumulative for _, cumulative, _ in top_level)
+    print(f"import {args.module}: {total / 1000:.1f} ms cumulative")
+    for own, cumulative, package in sorted(times, key=lambda entry: entry[1], reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:8.1f} ms {own / 1000:8.1f} ms {package}")
+
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), f"{args.module}.py"), "--help"]
+    runs = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        subprocess.run(command, capture_output=True, check=True)
+        runs.append(time.perf_counter() - start)
+    best = min(runs) * 1000
+    print(f"{args.module}.py --help: best of {args.repeat} {best:.1f} ms")
+
+    failed = False
+    if eager := eager_imports(args.module):
+        print(f"import {args.module} loads deferred modules: {', '.join(eager)}", file=sys.stderr)
+        failed = True
+    if best > args.max_ms:
+        print(f"cold start regressed: {best:.1f} ms > {args.max_ms} ms", file=sys.stderr)
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def submit_documents(args, data: bytes) -> tuple[list[float], float]:
+    import service
+
+    async def timed_parse(timetable_service):
+        start = time.perf_counter()
+        await timetable_service.parse_pdf(data)
+        return time.perf_counter() - start
+
+    async with service.TimetableService(
+            workers=args.workers, max_documents=args.max_documents, pages_per_task=args.pages_per_task
+    ) as timetable_service:
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(timed_parse(timetable_service) for _ in range(args.documents)))
+        return latencies, time.perf_counter() - start
+
+
+def bench_service(args):
+    import warnings
+
+    warnings.simplefilter("ignore", RuntimeWarning)
+    with open(args.pdf, "rb") as fp:
+        data = fp.read()
+    latencies, total = asyncio.run(submit_documents(args, data))
+    print(f"{args.documents} concurrent documents in {total:.2f} s ({args.documents / total:.2f} documents/s)")
+    print(f"latency p50 {percentile(latencies, .5):.2f} s, p99 {percentile(latencies, .99):.2f} s, "
+          f"max {max(latencies):.2f} s")
+
+
+def synthetic_school_lessons(classes: int) -> list:
+    import school
+
+    lessons = []
+    for subject, name, surname, room, class_name, group, day, hour in synthetic_lessons(classes):
+        lesson = school.Lesson(
+            school.Subject(subject),
+            school.Teacher(name, surname=surname),
+            room,
+            school.Group(group),
+            time=school.LessonTime(hour, day)
+        )
+        lesson.class_name = class_name
+        lessons.append(lesson)
+    return lessons
+
+
+def measure(function) -> tuple[float, int, object]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def bench_snapshot(args):
+    import snapshot
+
+    lessons = synthetic_school_lessons(args.classes)
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot_path = os.path.join(directory, "lessons.snap")
+        pickle_path = os.path.join(directory, "lessons.pickle")
+        snapshot.dump(lessons, snapshot_path)
+        with open(pickle_path, "wb") as fp:
+            pickle.dump(lessons, fp)
+        print(f"{len(lessons)} lessons: snapshot {os.path.getsize(snapshot_path) / 1024:.0f} KiB, "
+              f"pickle {os.path.getsize(pickle_path) / 1024:.0f} KiB")
+
+        def load_pickle():
+            with open(pickle_path, "rb") as fp:
+                return pickle.load(fp)
+
+        for label, function in (
+                ("pickle load", load_pickle),
+                ("snapshot load", lambda: snapshot.load(snapshot_path)),
+                ("snapshot load + one class", lambda: [
+                    lesson for lesson in snapshot.load(snapshot_path)[:45]
+                ]),
+                ("snapshot load + all", lambda: list(snapshot.load(snapshot_path))),
+        ):
+            elapsed, peak, _ = measure(function)
+            print(f"{label:>26}: {elapsed * 1000:8.2f} ms, peak {peak / 1024:8.0f} KiB")
+
+
+def bench_views(args):
+    import datetime
+
+    import views
+
+    lessons = synthetic_school_lessons(args.classes)
+    calendar_start = datetime.date(2023, 9, 4) if args.calendar else None
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        regenerated = views.export(lessons, directory, calendar_start=calendar_start)
+        full = time.perf_counter() - start
+        print(f"full export of {len(lessons)} lessons: {full * 1000:8.1f} ms, "
+              + ", ".join(f"{len(keys)} {family}" for family, keys in regenerated.items()))
+
+        start = time.perf_counter()
+        regenerated = views.export(lessons, directory, calendar_start=calendar_start)
+        print(f"unchanged re-export: {(time.perf_counter() - start) * 1000:8.1f} ms, "
+              + ", ".join(f"{len(keys)} {family}" for family, keys in regenerated.items()))
+
+        # one class page changes: its first lesson moves to another room
+        changed = lessons[0]
+        changed.room = "999"
+        start = time.perf_counter()
+        regenerated = views.export(lessons, directory, calendar_start=calendar_start)
+        print(f"class {changed.class_name!r} changed: {(time.perf_counter() - start) * 1000:8.1f} ms, "
+              + ", ".join(f"{len(keys)} {family}" for family, keys in regenerated.items()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Timetable parser benchmarks")
+    subparsers = parser.add_subparsers(required=True)
+
+    database_parser = subparsers.add_parser("database", help="compare SQLite load and query times per profile and index timing")
+    database_parser.add_argument("--classes", type=int, default=500)
+    database_parser.add_argument("--repeat", type=int, default=10)
+    database_parser.set_defaults(func=bench_database)
+
+    startup_parser = subparsers.add_parser("startup", help="report import times, fail if cold start regresses")
+    startup_parser.add_argument("--module", default="zschie_timetable_xml")
+    startup_parser.add_argument("--top", type=int, default=15)
+    startup_parser.add_argument("--repeat", type=int, default=5)
+    # --help measured at about 55-60 ms
+    startup_parser.add_argument("--max-ms", type=float, default=100)
+    startup_parser.set_defaults(func=bench_startup)
+
+    service_parser = subparsers.add_parser("service", help="load test TimetableService with concurrent uploads")
+    service_parser.add_argument("pdf", nargs="?", default="Plan-zajec-edukacyjnych-od-dnia-4.09.2023-r..pdf")
+    service_parser.add_argument("--documents", type=int, default=8)
+    service_parser.add_argument("--workers", type=int, default=None)
+    service_parser.add_argument("--max-documents", type=int, default=4)
+    service_parser.add_argument("--pages-per-task", type=int, default=4)
+    service_parser.set_defaults(func=bench_service)
+
+    snapshot_parser = subparsers.add_parser("snapshot", help="compare snapshot and pickle reload of parsed lessons")
+    snapshot_parser.add_argument("--classes", type=int, default=500)
+    snapshot_parser.set_defaults(func=bench_snapshot)
+
+    views_parser = subparsers.add_parser("views", help="time full and incremental export of timetable views")
+    views_parser.add_argument("--classes", type=int, default=500)
+    views_parser.add_argument("--calendar", action="store_true", help="also export iCalendar files")
+    views_parser.set_defaults(func=bench_views)
+
+    arguments = parser.parse_args()
+    arguments.func(arguments)
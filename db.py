@@ -1,26 +1,76 @@
 import os
 from sqlite3 import connect
 import sqlite3
-import sqlalchemy as db
-from typing import TypeVar
+
+
+# PRAGMA sets applied right after the connection is opened.
+# "bulk" trades durability for speed, which is fine because the database is rebuilt from the PDF on every run.
+PROFILES: dict[str, dict[str, str | int]] = {
+    "default": {},
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64_000,
+        "temp_store": "MEMORY",
+    },
+    "bulk": {
+        "journal_mode": "OFF",
+        "synchronous": "OFF",
+        "cache_size": -256_000,
+        "temp_store": "MEMORY",
+        "locking_mode": "EXCLUSIVE",
+    },
+}
 
 
 class Database:
     connection: sqlite3.Connection
     cursor: sqlite3.Cursor
 
+    def __init__(self, path: str = "database.db", *, profile: str = "default", compact_path: str | None = None):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown database profile {profile!r}, expected one of {', '.join(PROFILES)}")
+        self.path = path
+        self.profile = profile
+        self.compact_path = compact_path
+
     def __enter__(self):
-        os.remove("database.db")
-        self.connection = connect("database.db")
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.connection = connect(self.path)
         self.cursor = self.connection.cursor()
+        self.apply_profile()
         self.initialize()
         return self.cursor
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            # indexes are built once over the loaded rows instead of being maintained on every insert
+            self.create_indexes()
         self.connection.commit()
+        if exc_type is None:
+            self.finalize(self.compact_path)
         self.connection.close()
         return False
 
+    def apply_profile(self):
+        for pragma, value in PROFILES[self.profile].items():
+            self.cursor.execute(f"PRAGMA {pragma} = {value}")
+
+    def create_indexes(self):
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_subjects_name ON Subjects (name)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_teachers_name_surname ON Teachers (name, surname)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_lessons_class_day_hour ON Lessons (class_id, day, hour)")
+
+    def finalize(self, output: str | None = None):
+        # collect statistics for the query planner, optionally write a defragmented copy for readers
+        self.cursor.execute("ANALYZE")
+        self.connection.commit()
+        if output is not None:
+            if os.path.exists(output):
+                os.remove(output)
+            self.cursor.execute("VACUUM INTO ?", (output,))
+
     def initialize(self):
         # create tables if they don't exist
         self.cursor.execute(
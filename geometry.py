@@ -18,6 +18,13 @@ class Line:
         self.x2 = round(self.x2, -2)
         self.y2 = round(self.y2, -2)
 
+    @classmethod
+    def from_normalized(cls, x1: int, y1: int, x2: int, y2: int):
+        # coordinates already checked and rounded in bulk (see normalizePage), skips __post_init__
+        line = cls.__new__(cls)
+        line.x1, line.y1, line.x2, line.y2 = x1, y1, x2, y2
+        return line
+
     @property
     def width(self):
         return abs(self.x2 - self.x1)
@@ -0,0 +1,132 @@
+import dataclasses
+import io
+import mmap
+import os
+
+
+@dataclasses.dataclass(frozen=True)
+class PDFHandle:
+    # picklable reference to a PDF that worker processes attach to instead of receiving its bytes
+    size: int
+    path: str | None = None
+    shm_name: str | None = None
+
+
+class BufferReader(io.RawIOBase):
+    """Seekable, read-only file object over a buffer, which is what pdfminer expects from ``open(..., 'rb')``."""
+
+    def __init__(self, buffer):
+        super().__init__()
+        self._view = memoryview(buffer).cast("B")
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = len(self._view) + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return position
+
+    def read(self, size=-1):
+        start = min(self._position, len(self._view))
+        end = len(self._view) if size is None or size < 0 else min(start + size, len(self._view))
+        self._position = end
+        return self._view[start:end].tobytes()
+
+    def readinto(self, buffer):
+        # copies straight from the mapping into the caller's buffer
+        start = min(self._position, len(self._view))
+        size = min(len(buffer), len(self._view) - start)
+        memoryview(buffer).cast("B")[:size] = self._view[start:start + size]
+        self._position = start + size
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+class PDFSource:
+    """
+        A PDF mapped into memory once and shared with worker processes.
+
+        ``open`` memory-maps a file, ``share`` copies bytes (e.g. an upload) into a shared memory block,
+        and ``attach`` maps the same data again in another process from a ``PDFHandle``.
+    """
+
+    def __init__(self, handle: PDFHandle, buffer, closer, *, unlink=None):
+        self.handle = handle
+        self._buffer = buffer
+        self._closer = closer
+        self._unlink = unlink
+        self._readers: list[BufferReader] = []
+
+    @classmethod
+    def open(cls, path: str):
+        with open(path, "rb") as fp:
+            mapping = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        handle = PDFHandle(len(mapping), path=os.path.abspath(path))
+        return cls(handle, mapping, mapping.close)
+
+    @classmethod
+    def share(cls, data: bytes):
+        from multiprocessing import shared_memory
+
+        memory = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        memory.buf[:len(data)] = data
+        handle = PDFHandle(len(data), shm_name=memory.name)
+        return cls(handle, memory.buf, memory.close, unlink=memory.unlink)
+
+    @classmethod
+    def attach(cls, handle: PDFHandle):
+        if handle.shm_name is not None:
+            from multiprocessing import shared_memory
+
+            memory = shared_memory.SharedMemory(name=handle.shm_name)
+            return cls(handle, memory.buf, memory.close)
+        with open(handle.path, "rb") as fp:
+            mapping = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(handle, mapping, mapping.close)
+
+    def reader(self) -> BufferReader:
+        # shared memory blocks may be rounded up to the page size, so the view is cut to the real length
+        reader = BufferReader(memoryview(self._buffer)[:self.handle.size])
+        self._readers.append(reader)
+        return reader
+
+    def close(self):
+        # all exported views have to be released before the mapping can be closed
+        for reader in self._readers:
+            reader.close()
+        self._readers.clear()
+        if self._closer is not None:
+            self._buffer = None
+            self._closer()
+            self._closer = None
+            if self._unlink is not None:
+                self._unlink()
+                self._unlink = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
@@ -0,0 +1,72 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+import pdfsource
+import school
+import zschie_timetable_xml as parser
+from school import Subject, Teacher
+
+
+def _countPages(handle: pdfsource.PDFHandle) -> int:
+    with pdfsource.PDFSource.attach(handle) as source:
+        return parser.countPages(source.reader())
+
+
+def _readPages(
+        handle: pdfsource.PDFHandle,
+        page_numbers: list[int]
+) -> tuple[list[school.Lesson], list[school.Teacher]]:
+    # workers are reused between documents, so nothing may leak from the previous one:
+    # the registries are emptied and pdfminer's resource manager (it caches fonts by object id) is recreated
+    Teacher.ALL.clear()
+    Subject.ALL.clear()
+    parser.createInterpreter()
+    with pdfsource.PDFSource.attach(handle) as source:
+        return parser.readPages(page_numbers, pdf_source=source)
+
+
+class TimetableService:
+    """
+        Parses uploaded timetable PDFs concurrently.
+
+        Pages are parsed in a bounded process pool; at most ``max_documents`` documents are in flight,
+        further ``parse_pdf`` calls wait for a free slot. Nothing is written to the database.
+    """
+
+    def __init__(self, *, workers: int | None = None, max_documents: int = 4, pages_per_task: int = 4):
+        self.pages_per_task = pages_per_task
+        self._executor = ProcessPoolExecutor(workers)
+        self._slots = asyncio.Semaphore(max_documents)
+
+    async def parse_pdf(self, data: bytes) -> list[school.Lesson]:
+        loop = asyncio.get_running_loop()
+        async with self._slots:
+            # the upload is copied once into shared memory, workers attach to it by name
+            with pdfsource.PDFSource.share(data) as source:
+                page_count = await loop.run_in_executor(self._executor, _countPages, source.handle)
+                page_numbers = list(range(page_count))
+                results = await asyncio.gather(*(
+                    loop.run_in_executor(
+                        self._executor, _readPages, source.handle, page_numbers[i:i + self.pages_per_task]
+                    )
+                    for i in range(0, page_count, self.pages_per_task)
+                ))
+
+        lessons: list[school.Lesson] = []
+        class_names = {}
+        for chunk_lessons, educators in results:
+            lessons += chunk_lessons
+            class_names |= {educator: educator.class_name for educator in educators}
+        for lesson in lessons:
+            lesson.teacher.class_name = class_names.get(lesson.teacher)
+        return lessons
+
+    def close(self):
+        self._executor.shutdown(cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+        return False
@@ -0,0 +1,193 @@
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+
+import school
+from school import Lesson, Subject, Teacher, Group, LessonTime
+
+MAGIC = b"TTSNAP"
+VERSION = 1
+# magic, version, number of strings, teachers and lessons, size of the string blob
+HEADER = struct.Struct("<6sHIIII")
+TEACHER_FIELDS = 3  # name, surname, class_name
+LESSON_FIELDS = 8  # subject, teacher, room, group, class_name, hour, day, block_length
+NONE = -1
+
+
+class _StringTable:
+    def __init__(self):
+        self.strings: list[str] = []
+        self.indexes: dict[str, int] = {}
+
+    def intern(self, string: str | None) -> int:
+        if string is None:
+            return NONE
+        if string not in self.indexes:
+            self.indexes[string] = len(self.strings)
+            self.strings.append(string)
+        return self.indexes[string]
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def dump(lessons: list[school.Lesson], path: str):
+    strings = _StringTable()
+    teachers: dict[tuple[int, int, int], int] = {}
+    teacher_table = array("i")
+    lesson_table = array("i")
+    for lesson in lessons:
+        teacher = (
+            strings.intern(lesson.teacher.name),
+            strings.intern(lesson.teacher.surname),
+            strings.intern(lesson.teacher.class_name)
+        )
+        if teacher not in teachers:
+            teachers[teacher] = len(teachers)
+            teacher_table.extend(teacher)
+        lesson_table.extend((
+            strings.intern(lesson.subject.name),
+            teachers[teacher],
+            strings.intern(lesson.room),
+            strings.intern(lesson.groups.any),
+            strings.intern(lesson.class_name),
+            *lesson.time
+        ))
+
+    encoded = [string.encode() for string in strings.strings]
+    offsets = array("i", [0])
+    for string in encoded:
+        offsets.append(offsets[-1] + len(string))
+
+    with open(path, "wb") as fp:
+        fp.write(HEADER.pack(MAGIC, VERSION, len(encoded), len(teachers), len(lessons), offsets[-1]))
+        fp.write(_little_endian(offsets))
+        fp.write(_little_endian(teacher_table))
+        fp.write(_little_endian(lesson_table))
+        fp.write(b"".join(encoded))
+
+
+class Snapshot(Sequence):
+    """
+        Lessons of a parsed document, read from a memory-mapped snapshot.
+
+        Only the integer tables are mapped on load; strings and ``school`` objects are created
+        the first time a lesson is accessed and cached, so repeated subjects and teachers are shared.
+        Subjects and teachers are restored as dumped, without registering them in ``Subject.ALL``/``Teacher.ALL``.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as fp:
+            self._mapping = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mapping) < HEADER.size:
+            self._mapping.close()
+            raise ValueError(f"{path!r} is not a timetable snapshot")
+        magic, version, string_count, teacher_count, lesson_count, blob_size = HEADER.unpack_from(self._mapping)
+        if magic != MAGIC:
+            self._mapping.close()
+            raise ValueError(f"{path!r} is not a timetable snapshot")
+        if version != VERSION:
+            self._mapping.close()
+            raise ValueError(f"Unsupported snapshot version {version}, expected {VERSION}")
+        integers = string_count + 1 + teacher_count * TEACHER_FIELDS + lesson_count * LESSON_FIELDS
+        if len(self._mapping) != HEADER.size + integers * 4 + blob_size:
+            self._mapping.close()
+            raise ValueError(f"{path!r} is truncated or corrupted, its size does not match the header")
+
+        view = memoryview(self._mapping)
+        position = HEADER.size
+        sections = []
+        for count in (string_count + 1, teacher_count * TEACHER_FIELDS, lesson_count * LESSON_FIELDS):
+            sections.append(self._integers(view[position:position + count * 4]))
+            position += count * 4
+        self._offsets, self._teacher_table, self._lesson_table = sections
+        self._blob = view[position:position + blob_size]
+
+        self._strings: dict[int, str] = {}
+        self._subjects: dict[int, school.Subject] = {}
+        self._teachers: dict[int, school.Teacher] = {}
+        self._lessons: list[school.Lesson | None] = [None] * lesson_count
+
+    @staticmethod
+    def _integers(buffer: memoryview):
+        if sys.byteorder == "big":
+            values = array("i", buffer.tobytes())
+            values.byteswap()
+            return memoryview(values)
+        return buffer.cast("i")
+
+    def _string(self, index: int) -> str | None:
+        if index == NONE:
+            return None
+        if index not in self._strings:
+            self._strings[index] = self._blob[self._offsets[index]:self._offsets[index + 1]].tobytes().decode()
+        return self._strings[index]
+
+    def _subject(self, index: int) -> school.Subject:
+        if index not in self._subjects:
+            # names were normalized when parsed, __post_init__ would normalize them again and register the subject
+            subject = Subject.__new__(Subject)
+            subject.name = self._string(index)
+            self._subjects[index] = subject
+        return self._subjects[index]
+
+    def _teacher(self, index: int) -> school.Teacher:
+        if index not in self._teachers:
+            name, surname, class_name = self._teacher_table[index * TEACHER_FIELDS:(index + 1) * TEACHER_FIELDS]
+            # same as for subjects, Teacher.ALL is left untouched by loading a snapshot
+            teacher = Teacher.__new__(Teacher)
+            teacher.name = self._string(name)
+            teacher.surname = self._string(surname)
+            teacher.class_name = self._string(class_name)
+            self._teachers[index] = teacher
+        return self._teachers[index]
+
+    def _lesson(self, index: int) -> school.Lesson:
+        subject, teacher, room, group, class_name, hour, day, block_length = \
+            self._lesson_table[index * LESSON_FIELDS:(index + 1) * LESSON_FIELDS]
+        lesson = Lesson(
+            self._subject(subject),
+            self._teacher(teacher),
+            self._string(room),
+            Group(self._string(group)),
+            time=LessonTime(hour, day, block_length)
+        )
+        lesson.class_name = self._string(class_name)
+        return lesson
+
+    def __len__(self):
+        return len(self._lessons)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("lesson index out of range")
+        if self._lessons[index] is None:
+            self._lessons[index] = self._lesson(index)
+        return self._lessons[index]
+
+    def close(self):
+        # the views into the mapping have to be released before it can be closed
+        for section in (self._offsets, self._teacher_table, self._lesson_table, self._blob):
+            section.release()
+        self._mapping.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+
+def load(path: str) -> Snapshot:
+    return Snapshot(path)
@@ -0,0 +1,196 @@
+import datetime
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+
+import school
+
+FAMILIES = ("classes", "teachers", "rooms")
+MANIFEST = "manifest.json"
+VERSION = 1
+# approximate bell schedule used for calendar events, hour 0 starts at FIRST_HOUR
+FIRST_HOUR = datetime.time(8, 0)
+LESSON_MINUTES = 45
+BREAK_MINUTES = 10
+
+
+def teacher_key(teacher: school.Teacher) -> str:
+    return teacher.name if teacher.surname is None else f"{teacher.name} {teacher.surname}"
+
+
+def lesson_keys(lesson: school.Lesson) -> dict[str, list[str]]:
+    return {
+        "classes": [lesson.class_name] if lesson.class_name is not None else [],
+        "teachers": [teacher_key(lesson.teacher)],
+        # lessons split between rooms are written as "A6,A9"
+        "rooms": [room.strip() for room in lesson.room.split(",") if room.strip()],
+    }
+
+
+def build_index(lessons: list[school.Lesson]) -> dict[str, dict[str, list[school.Lesson]]]:
+    index = {family: {} for family in FAMILIES}
+    for lesson in lessons:
+        for family, keys in lesson_keys(lesson).items():
+            for key in keys:
+                index[family].setdefault(key, []).append(lesson)
+    return index
+
+
+def lesson_entry(lesson: school.Lesson) -> dict:
+    return {
+        "subject": lesson.subject.name,
+        "teacher": teacher_key(lesson.teacher),
+        "room": lesson.room,
+        "group": lesson.groups.any,
+        "class": lesson.class_name,
+        "hour": lesson.time.hour,
+        "length": lesson.time.block_length,
+    }
+
+
+def render_view(family: str, key: str, lessons: list[school.Lesson]) -> dict:
+    # week grid: day -> hour -> lessons taking place, blocks occupy every hour they span
+    days: dict[int, dict[int, list[dict]]] = {}
+    for lesson in sorted(lessons, key=lambda lesson: (lesson.time.day, lesson.time.hour)):
+        entry = lesson_entry(lesson)
+        for hour in range(lesson.time.hour, lesson.time.hour + lesson.time.block_length):
+            days.setdefault(lesson.time.day, {}).setdefault(hour, []).append(entry)
+    return {"family": family, "name": key, "days": days}
+
+
+def _escape(text: str) -> str:
+    return re.sub(r"([\\;,])", r"\\\1", text).replace("\n", "\\n")
+
+
+def render_calendar(family: str, key: str, lessons: list[school.Lesson], start: datetime.date) -> str:
+    # start is the first day of the timetable, lessons repeat weekly from the first matching weekday
+    monday = start - datetime.timedelta(days=start.weekday())
+    stamp = monday.strftime("%Y%m%dT000000Z")
+    events = []
+    for lesson in sorted(lessons, key=lambda lesson: (lesson.time.day, lesson.time.hour)):
+        day = monday + datetime.timedelta(days=lesson.time.day)
+        if day < start:
+            day += datetime.timedelta(weeks=1)
+        begin = datetime.datetime.combine(day, FIRST_HOUR) + \
+            datetime.timedelta(minutes=lesson.time.hour * (LESSON_MINUTES + BREAK_MINUTES))
+        minutes = lesson.time.block_length * (LESSON_MINUTES + BREAK_MINUTES) - BREAK_MINUTES
+        entry = lesson_entry(lesson)
+        uid = hashlib.sha1(json.dumps([family, key, entry, lesson.time.day]).encode()).hexdigest()
+        description = ", ".join(filter(None, (entry["teacher"], entry["class"], entry["group"])))
+        events += [
+            "BEGIN:VEVENT",
+            f"UID:{uid}@timetable",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART:{begin:%Y%m%dT%H%M%S}",
+            f"DURATION:PT{minutes}M",
+            "RRULE:FREQ=WEEKLY",
+            f"SUMMARY:{_escape(entry['subject'])}",
+            f"LOCATION:{_escape(entry['room'])}",
+            f"DESCRIPTION:{_escape(description)}",
+            "END:VEVENT",
+        ]
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//TimeTablePdfParser//views//PL",
+        f"X-WR-CALNAME:{_escape(key)}",
+        *events,
+        "END:VCALENDAR",
+    ]
+    return "\r\n".join(lines) + "\r\n"
+
+
+def file_name(key: str) -> str:
+    return re.sub(r"[^\w-]+", "_", key).strip("_") or "_"
+
+
+def class_digests(index: dict[str, dict[str, list[school.Lesson]]]) -> dict[str, dict]:
+    # what every lesson of a class contributes to the views, used to find the views affected by a changed class page
+    digests = {}
+    for class_name, lessons in index["classes"].items():
+        records = []
+        for lesson in lessons:
+            entry = json.dumps(lesson_entry(lesson) | {"day": lesson.time.day}, ensure_ascii=False)
+            keys = lesson_keys(lesson)
+            records.append([hashlib.sha1(entry.encode()).hexdigest(), keys["teachers"], keys["rooms"]])
+        records.sort()
+        digests[class_name] = {
+            "hash": hashlib.sha1("".join(record[0] for record in records).encode()).hexdigest(),
+            "lessons": records,
+        }
+    return digests
+
+
+def export(
+        lessons: list[school.Lesson],
+        directory: str,
+        *,
+        calendar_start: datetime.date | None = None,
+        full: bool = False
+) -> dict[str, set[str]]:
+    """
+        Writes the class, teacher and room views of ``lessons`` as JSON (and iCalendar if ``calendar_start`` is set).
+
+        A manifest of every class' lessons is kept in ``directory``; views are only rewritten for changed classes
+        and for the teachers and rooms of their added or removed lessons. Returns the regenerated keys of every family.
+    """
+    index = build_index(lessons)
+    digests = class_digests(index)
+    settings = {"version": VERSION, "calendar_start": calendar_start and calendar_start.isoformat()}
+
+    manifest_path = os.path.join(directory, MANIFEST)
+    previous = {}
+    if not full and os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as fp:
+            manifest = json.load(fp)
+        if manifest["settings"] == settings:
+            previous = manifest["classes"]
+
+    if previous:
+        affected = {family: set() for family in FAMILIES}
+        for class_name in digests.keys() | previous.keys():
+            old, new = previous.get(class_name), digests.get(class_name)
+            if old is not None and new is not None and old["hash"] == new["hash"]:
+                continue
+            affected["classes"].add(class_name)
+            # only lessons that were added or removed touch teacher and room views
+            old_records = Counter(map(json.dumps, old["lessons"] if old else []))
+            new_records = Counter(map(json.dumps, new["lessons"] if new else []))
+            for record in (old_records - new_records) + (new_records - old_records):
+                _, teachers, rooms = json.loads(record)
+                affected["teachers"] |= set(teachers)
+                affected["rooms"] |= set(rooms)
+    else:
+        affected = {family: set(index[family]) for family in FAMILIES}
+
+    for family in FAMILIES:
+        family_directory = os.path.join(directory, family)
+        os.makedirs(family_directory, exist_ok=True)
+        if not previous:
+            # full rebuild: views of keys that are gone, and calendars no longer requested, are left from earlier exports
+            current = {file_name(key) for key in index[family]}
+            for entry in os.listdir(family_directory):
+                stem, extension = os.path.splitext(entry)
+                if extension not in (".json", ".ics"):
+                    continue
+                if stem not in current or (extension == ".ics" and calendar_start is None):
+                    os.remove(os.path.join(family_directory, entry))
+        for key in affected[family]:
+            path = os.path.join(family_directory, file_name(key))
+            if key not in index[family]:
+                # the class, teacher or room is gone from the timetable
+                for extension in (".json", ".ics"):
+                    if os.path.exists(path + extension):
+                        os.remove(path + extension)
+                continue
+            with open(path + ".json", "w", encoding="utf-8") as fp:
+                json.dump(render_view(family, key, index[family][key]), fp, ensure_ascii=False)
+            if calendar_start is not None:
+                with open(path + ".ics", "w", encoding="utf-8", newline="") as fp:
+                    fp.write(render_calendar(family, key, index[family][key], calendar_start))
+
+    with open(manifest_path, "w", encoding="utf-8") as fp:
+        json.dump({"settings": settings, "classes": digests}, fp, ensure_ascii=False)
+    return affected
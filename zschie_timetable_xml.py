@@ -1,26 +1,25 @@
-import dataclasses
+from __future__ import annotations
+
+import argparse
 import re
 import sqlite3
 import warnings
-from typing import Iterator
-
-import tkinter as tk
-
-from pdfminer.layout import LAParams, LTTextBox, LTLine
-from pdfminer.pdfpage import PDFPage
-from pdfminer.pdfinterp import PDFResourceManager
-from pdfminer.pdfinterp import PDFPageInterpreter
-from pdfminer.converter import PDFPageAggregator
+from datetime import date
+from typing import TYPE_CHECKING
 
 import db
 import geometry
+import pdfsource
 import school
 from geometry import Line, Point, Box
 from school import Subject, Teacher, Group
-from pprint import pprint
 
-import numpy as np
-import pandas as pd
+# pdfminer, pandas and tkinter are imported inside the code paths that use them,
+# so that importing this module (or running --help) stays cheap
+if TYPE_CHECKING:
+    from pdfminer.pdfpage import PDFPage
+    from pdfminer.pdfinterp import PDFPageInterpreter
+    from pdfminer.converter import PDFPageAggregator
 
 
 def processPage(
@@ -28,78 +27,84 @@ def processPage(
         *,
         pdf_interpreter: PDFPageInterpreter,
         pdf_device: PDFPageAggregator
-) -> Iterator[geometry.Line | geometry.Text]:
+) -> tuple[list[tuple[float, float, float, float]], list[tuple[float, float, float, float]], list[str]]:
+    from pdfminer.layout import LTTextBox, LTLine
+
     pdf_interpreter.process_page(page)
     layout = pdf_device.get_result()
 
+    line_boxes, text_boxes, text_strings = [], [], []
     for lobj in layout:
-        if not hasattr(lobj, "bbox"):  # skip objects without bounding box
-            continue
-        x1, y1, x2, y2 = map(lambda x: int(x * 10_000), lobj.bbox)
         if isinstance(lobj, LTTextBox):
-            yield geometry.Text(
-                lobj.get_text(),
-                geometry.Box(geometry.Point(x1, y1), geometry.Point(x2, y2)),
-            )
+            text_boxes.append(lobj.bbox)
+            text_strings.append(lobj.get_text())
         elif isinstance(lobj, LTLine):
-            yield geometry.Line(x1, y1, x2, y2)
+            line_boxes.append(lobj.bbox)
+    return line_boxes, text_boxes, text_strings
 
 
-def readPage(page: PDFPage):
-    global interpreter, device
-
-    objects = processPage(page, pdf_interpreter=interpreter, pdf_device=device)
+def normalizePage(
+        line_boxes: list[tuple[float, float, float, float]],
+        text_boxes: list[tuple[float, float, float, float]],
+        *,
+        header_texts: int = 4
+):
+    """
+        Quantizes, flips and bounds all primitives of a page at once.
 
-    lines, texts = [], []
-    lines: list[geometry.Line]
-    for obj in objects:
-        if isinstance(obj, geometry.Line):
-            lines.append(obj)
-        elif isinstance(obj, geometry.Text):
-            texts.append(obj)
-    _, class_name, _, educator, *texts = texts
-    app = tk.Tk()
-    canvas = tk.Canvas(app, width=1200, height=800)
+        Coordinates are scaled to integers and line coordinates are rounded to hundreds (as ``Line`` does),
+        the y-axis of lines and of the texts after the ``header_texts`` is flipped inside the lines' bounding box.
+        Returns the bounding box of all lines, the rectangle of the timetable grid and the coordinate arrays.
+    """
+    import numpy as np
 
-    top_left_x = float("+inf")
-    top_left_y = float("+inf")
-    bottom_right_x = float("-inf")
-    bottom_right_y = float("-inf")
+    lines = (np.asarray(line_boxes, dtype=np.float64).reshape(-1, 4) * 10_000).astype(np.int64)
+    texts = (np.asarray(text_boxes, dtype=np.float64).reshape(-1, 4) * 10_000).astype(np.int64)
+    assert (lines[:, 0] <= lines[:, 2]).all() and (lines[:, 1] <= lines[:, 3]).all()
+    lines = np.round(lines, -2)
 
     # find the top left and bottom right points
-    for line in lines:
-        x1, y1, x2, y2 = line
-        top_left_x = min(top_left_x, x1)
-        top_left_y = min(top_left_y, y1)
-        bottom_right_x = max(bottom_right_x, x2)
-        bottom_right_y = max(bottom_right_y, y2)
-
-    # rotate all lines by 180 degrees on the x-axis
-    for line in lines:
-        line.y1 = bottom_right_y - line.y1 + top_left_y
-        line.y2 = bottom_right_y - line.y2 + top_left_y
-
-        line.y1, line.y2 = line.y2, line.y1
-        canvas.create_line(*line.dimensions)
-    # rotate all texts by 180 degrees on the x-axis
-    for text in texts:
-        text.box.top_left.y = bottom_right_y - text.box.top_left.y + top_left_y
-        text.box.bottom_right.y = bottom_right_y - text.box.bottom_right.y + top_left_y
+    top_left_x, top_left_y = lines[:, :2].min(axis=0).tolist()
+    bottom_right_x, bottom_right_y = lines[:, 2:].max(axis=0).tolist()
 
-        text.box.top_left.y, text.box.bottom_right.y = text.box.bottom_right.y, text.box.top_left.y
+    # rotate all lines and texts by 180 degrees on the x-axis, y1 and y2 swap to stay ordered
+    lines[:, [1, 3]] = bottom_right_y + top_left_y - lines[:, [3, 1]]
+    texts[header_texts:, [1, 3]] = bottom_right_y + top_left_y - texts[header_texts:, [3, 1]]
 
-    timetable_rect = Line(
-        sorted(set(map(lambda x: x.x1, lines)))[1],
-        sorted(set(map(lambda x: x.y1, lines)))[1],
-        sorted(set(map(lambda x: x.x1, lines)), reverse=True)[0],
-        sorted(set(map(lambda x: x.y1, lines)), reverse=True)[0]
-    )
+    columns, rows = np.unique(lines[:, 0]), np.unique(lines[:, 1])
+    timetable_rect = (columns[1].item(), rows[1].item(), columns[-1].item(), rows[-1].item())
 
-    canvas.create_rectangle(
-        *timetable_rect.dimensions,
-        outline="red",
-        width=2
-    )
+    return (top_left_x, top_left_y, bottom_right_x, bottom_right_y), timetable_rect, lines, texts
+
+
+def readPage(page: PDFPage, *, draw: bool = False):
+    global interpreter, device
+
+    line_boxes, text_boxes, text_strings = processPage(page, pdf_interpreter=interpreter, pdf_device=device)
+    (top_left_x, top_left_y, bottom_right_x, bottom_right_y), timetable_rect, line_array, text_array = \
+        normalizePage(line_boxes, text_boxes)
+
+    lines: list[geometry.Line] = [Line.from_normalized(*line) for line in line_array.tolist()]
+    texts = [
+        geometry.Text(text, Box(Point(x1, y1), Point(x2, y2)))
+        for text, (x1, y1, x2, y2) in zip(text_strings, text_array.tolist())
+    ]
+    _, class_name, _, educator, *texts = texts
+    timetable_rect = Line.from_normalized(*timetable_rect)
+
+    canvas = None
+    if draw:
+        import tkinter as tk
+
+        app = tk.Tk()
+        canvas = tk.Canvas(app, width=1200, height=800)
+        for line in lines:
+            canvas.create_line(*line.dimensions)
+        canvas.create_rectangle(
+            *timetable_rect.dimensions,
+            outline="red",
+            width=2
+        )
 
     """
         Crazy algorithm to find lines that are in the same row or column and merge them into one line
@@ -136,10 +141,11 @@ def readPage(page: PDFPage):
     """
         End of crazy algorithm
     """
-    for line in left_to_right_lines:
-        canvas.create_line(*line.dimensions, fill="green", width=2)
-    for line in top_to_bottom_lines:
-        canvas.create_line(*line.dimensions, fill="purple", width=2)
+    if canvas is not None:
+        for line in left_to_right_lines:
+            canvas.create_line(*line.dimensions, fill="green", width=2)
+        for line in top_to_bottom_lines:
+            canvas.create_line(*line.dimensions, fill="purple", width=2)
 
     intersection_points: [Point] = []
     for horizontal in left_to_right_lines:
@@ -203,16 +209,17 @@ def readPage(page: PDFPage):
                 cell.texts.append(text)
                 break
 
-    for cell in cells:
-        for text in cell.texts:
-            canvas.create_text(
-                *map(Line.to_cm, text.box.top_left),
-                text=text.text,
-                anchor="nw",
-                font=("Arial", 7)
-            )
-        # if text := cell.get_lesson():
-        #     print(text)
+    if canvas is not None:
+        for cell in cells:
+            for text in cell.texts:
+                canvas.create_text(
+                    *map(Line.to_cm, text.box.top_left),
+                    text=text.text,
+                    anchor="nw",
+                    font=("Arial", 7)
+                )
+            # if text := cell.get_lesson():
+            #     print(text)
 
     lessons = list(filter(lambda x: x is not None, map(lambda x: x.get_lesson(), cells)))
 
@@ -236,9 +243,10 @@ def readPage(page: PDFPage):
         cell = cells.pop()
         draw_cell(cell)
 
-    canvas.bind("<Button-1>", lambda event: draw_next_cell())
-    canvas.pack()
-    # app.mainloop()
+    if canvas is not None:
+        canvas.bind("<Button-1>", lambda event: draw_next_cell())
+        canvas.pack()
+        # app.mainloop()
     educator_surname, educator_name = re.match("Wychowawca : (.+) (.+)", educator.text).groups()
     educator, = filter(
         lambda teacher: hash(teacher) == hash((educator_name, educator_surname)),
@@ -252,23 +260,96 @@ def readPage(page: PDFPage):
     return lessons
 
 
-if __name__ == '__main__':
-    fp = open('Plan-zajec-edukacyjnych-od-dnia-4.09.2023-r..pdf', 'rb')
+def createInterpreter():
+    global interpreter, device
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFResourceManager
+    from pdfminer.pdfinterp import PDFPageInterpreter
+    from pdfminer.converter import PDFPageAggregator
+
     rsrcmgr = PDFResourceManager()
     laparams = LAParams()
     laparams.line_margin = -.1
     device = PDFPageAggregator(rsrcmgr, laparams=laparams)
     interpreter = PDFPageInterpreter(rsrcmgr, device)
-    pages = PDFPage.get_pages(fp)
-    for i in range(0):  # 14
-        next(pages)
-    lessons: list[school.Lesson] = readPage(next(pages))
-    for page in pages:
+
+
+def initWorker(handle: pdfsource.PDFHandle):
+    # every worker maps the parent's PDF (file mapping or shared memory block) instead of receiving a copy
+    global source
+    source = pdfsource.PDFSource.attach(handle)
+    createInterpreter()
+
+
+def readPages(
+        page_numbers: list[int],
+        *,
+        pdf_source: pdfsource.PDFSource | None = None
+) -> tuple[list[school.Lesson], list[school.Teacher]]:
+    from pdfminer.pdfpage import PDFPage
+
+    fp = (pdf_source or source).reader()
+    lessons: list[school.Lesson] = []
+    for page in PDFPage.get_pages(fp, pagenos=page_numbers):
         lessons += readPage(page)
+    fp.close()
+    # class_name of educators is only set on this process' Teacher.ALL, so they are sent back explicitly
+    return lessons, [teacher for teacher in Teacher.ALL if teacher.class_name]
 
-    # pprint(Teacher.ALL)
 
-    with db.Database() as cursor:
+def countPages(fp) -> int:
+    from pdfminer.pdfparser import PDFParser
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfpage import PDFPage
+
+    return sum(1 for _ in PDFPage.create_pages(PDFDocument(PDFParser(fp))))
+
+
+def registerTeachers(lessons: list[school.Lesson], educators: list[school.Teacher]):
+    # rebuild Teacher.ALL in the parent, lessons unpickled from workers never ran __post_init__
+    for lesson in lessons:
+        Teacher.ALL.add(lesson.teacher)
+    teachers = {teacher: teacher for teacher in Teacher.ALL}
+    for educator in educators:
+        teachers.setdefault(educator, educator).class_name = educator.class_name
+        Teacher.ALL.add(educator)
+
+
+def expandBlocks(lessons: list[school.Lesson]):
+    """
+        One row per hour of every lesson, multi-hour blocks are repeated ``block_length`` times
+        with consecutive hours. ``lesson`` is the index of the row's lesson in ``lessons``.
+    """
+    import pandas as pd
+
+    lesson_rows = pd.DataFrame(
+        map(
+            lambda lesson: (
+                lesson.subject.name,
+                lesson.teacher.name,
+                lesson.teacher.surname,
+                lesson.room,
+                lesson.class_name,
+                lesson.groups.any,
+                lesson.time.day,
+                lesson.time.hour,
+                lesson.time.block_length
+            ),
+            lessons
+        ),
+        columns=[
+            "subject", "teacher_name", "teacher_surname", "room", "class_name", "group", "day", "hour", "block_length"
+        ]
+    )
+    lesson_rows = lesson_rows.loc[lesson_rows.index.repeat(lesson_rows["block_length"])]
+    lesson_rows["hour"] += lesson_rows.groupby(level=0).cumcount()
+    return lesson_rows.rename_axis("lesson").reset_index()
+
+
+def saveLessons(lessons: list[school.Lesson], database: db.Database):
+    import pandas as pd
+
+    with database as cursor:
         cursor.executemany(
             """
             INSERT INTO Teachers (name, surname, class_id)
@@ -350,35 +431,123 @@ if __name__ == '__main__':
                 warnings.warn(f"Subject_Teachers_Class {subject_teacher_group} was not added to the database,\ndue to {e}",
                               RuntimeWarning)
 
-        for lesson in lessons:
-            try:
-                for i in range(lesson.time.block_length):
-                    cursor.execute(
-                        """
-                        INSERT INTO Lessons (subject_id, teacher_id, room_id, class_id, [group], day, hour)
-                        VALUES (
-                            (SELECT subject_id FROM Subjects WHERE name = ? LIMIT 1),
-                            (SELECT teacher_id FROM Teachers WHERE name = ? AND surname = ? LIMIT 1),
-                            ?, ?, ?, ?, ?
-                        )
-                        """,
-                        (
-                            lesson.subject.name,
-                            lesson.teacher.name,
-                            lesson.teacher.surname,
-                            lesson.room,
-                            lesson.class_name,
-                            lesson.groups.any,
-                            lesson.time.day,
-                            lesson.time.hour + i
-                        )
-                    )
-            except sqlite3.IntegrityError as e:
-                warnings.warn(f"Lesson {lesson} was not added to the database,\ndue to {e}", RuntimeWarning)
-                continue  # skip block_length > 1 lessons immediately
+        lesson_rows = expandBlocks(lessons)
+        lesson_rows = lesson_rows.merge(
+            pd.read_sql_query("SELECT subject_id, name AS subject FROM Subjects ORDER BY subject_id", cursor.connection)
+            .drop_duplicates("subject"),
+            how="left"
+        ).merge(
+            pd.read_sql_query(
+                "SELECT teacher_id, name AS teacher_name, surname AS teacher_surname FROM Teachers ORDER BY teacher_id",
+                cursor.connection
+            ).drop_duplicates(["teacher_name", "teacher_surname"]),
+            how="left"
+        )
+
+        # the NOT NULL constraints are checked here, so a lesson is either added with all its hours or reported once
+        # DataFrame column -> Lessons column it is inserted into
+        required = {
+            "subject_id": "subject_id",
+            "teacher_id": "teacher_id",
+            "room": "room_id",
+            "class_name": "class_id",
+            "day": "day",
+            "hour": "hour",
+        }
+        invalid = lesson_rows[list(required)].isna()
+        first_invalid_column = invalid[invalid.any(axis=1)].idxmax(axis=1)
+        for lesson_index, column in first_invalid_column.groupby(lesson_rows["lesson"]).first().items():
+            warnings.warn(
+                f"Lesson {lessons[lesson_index]} was not added to the database,\n"
+                f"due to NOT NULL constraint failed: Lessons.{required[column]}",
+                RuntimeWarning
+            )
+        lesson_rows = lesson_rows[~invalid.any(axis=1)].astype({"subject_id": int, "teacher_id": int})
+
+        cursor.executemany(
+            """
+            INSERT INTO Lessons (subject_id, teacher_id, room_id, class_id, [group], day, hour)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            lesson_rows[["subject_id", "teacher_id", "room", "class_name", "group", "day", "hour"]]
+            .itertuples(index=False)
+        )
 
     # with db.Database() as db:
     #     db.add_teachers(Teacher.ALL)
     #     db.add_subjects(Subject.ALL)
     #     db.add_groups(Group.ALL)
     #     db.add_lessons(lessons)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Parse a school timetable PDF into an SQLite database")
+    parser.add_argument("pdf", nargs="?", default="Plan-zajec-edukacyjnych-od-dnia-4.09.2023-r..pdf")
+    parser.add_argument("--skip", type=int, default=0, help="number of leading pages to skip")
+    parser.add_argument("--pages", type=int, default=None, help="number of pages to read")
+    parser.add_argument("--database", default="database.db")
+    parser.add_argument("--profile", choices=db.PROFILES, default="bulk")
+    parser.add_argument("--compact", default=None, help="write a vacuumed copy of the database to this path")
+    parser.add_argument("--draw", action="store_true", help="draw the parsed grid of every page with tkinter")
+    parser.add_argument("--snapshot", default=None, help="also write the parsed lessons to this snapshot file")
+    parser.add_argument("--views", default=None, help="export class, teacher and room views to this directory")
+    parser.add_argument(
+        "--calendar-start", type=date.fromisoformat, default=None,
+        help="first day of the timetable (YYYY-MM-DD), also writes iCalendar views"
+    )
+    parser.add_argument("--jobs", type=int, default=1, help="number of worker processes parsing pages")
+    args = parser.parse_args(argv)
+    if args.skip < 0:
+        parser.error("--skip must not be negative")
+    if args.pages is not None and args.pages < 1:
+        parser.error("--pages must be at least 1")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.draw and args.jobs > 1:
+        parser.error("--draw cannot be used with --jobs, pages parsed in workers are not drawn")
+    if args.calendar_start is not None and args.views is None:
+        parser.error("--calendar-start requires --views")
+
+    from itertools import islice
+
+    from pdfminer.pdfpage import PDFPage
+
+    with pdfsource.PDFSource.open(args.pdf) as source:
+        stop = None if args.pages is None else args.skip + args.pages
+        lessons: list[school.Lesson] = []
+        if args.jobs > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            page_numbers = list(range(countPages(source.reader())))[args.skip:stop]
+            # contiguous chunks, so every worker walks the page tree once per chunk
+            size = max(1, -(-len(page_numbers) // args.jobs))
+            chunks = [page_numbers[i:i + size] for i in range(0, len(page_numbers), size)]
+            with ProcessPoolExecutor(args.jobs, initializer=initWorker, initargs=(source.handle,)) as executor:
+                for chunk_lessons, educators in executor.map(readPages, chunks):
+                    registerTeachers(chunk_lessons, educators)
+                    lessons += chunk_lessons
+        else:
+            createInterpreter()
+            for page in islice(PDFPage.get_pages(source.reader()), args.skip, stop):
+                lessons += readPage(page, draw=args.draw)
+
+    if not lessons:
+        parser.error(f"no lessons found in the selected pages of {args.pdf}")
+
+    # pprint(Teacher.ALL)
+
+    if args.snapshot is not None:
+        import snapshot
+
+        snapshot.dump(lessons, args.snapshot)
+
+    if args.views is not None:
+        import views
+
+        views.export(lessons, args.views, calendar_start=args.calendar_start)
+
+    saveLessons(lessons, db.Database(args.database, profile=args.profile, compact_path=args.compact))
+
+
+if __name__ == '__main__':
+    main()